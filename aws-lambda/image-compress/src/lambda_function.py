@@ -1,42 +1,13 @@
 import json
-import boto3
 import os
 from botocore.exceptions import ClientError
-from PIL import Image
-import io
+from image_engine import compress_image, get_s3_client
 
-# Initialize S3 client
-s3_client = boto3.client('s3')
+# Shared S3 client from the image engine layer
+s3_client = get_s3_client()
 SOURCE_BUCKET = os.environ['SOURCE_BUCKET']
 COMPRESSED_BUCKET = os.environ['COMPRESSED_BUCKET']
 
-def compress_image(image_bytes, quality=85, max_width=1920, max_height=1080):
-    """
-    Compress and resize image
-    """
-    try:
-        # Open image from bytes
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to RGB if necessary (for JPEG compatibility)
-        if image.mode in ('RGBA', 'P'):
-            image = image.convert('RGB')
-        
-        # Resize image if it's too large
-        if image.width > max_width or image.height > max_height:
-            image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-        
-        # Compress image
-        output_buffer = io.BytesIO()
-        image.save(output_buffer, format='JPEG', quality=quality, optimize=True)
-        output_buffer.seek(0)
-        
-        return output_buffer.getvalue()
-    
-    except Exception as e:
-        print(f'Error compressing image: {str(e)}')
-        raise e
-
 def lambda_handler(event, context):
     """
     Lambda handler that processes S3 image upload events, compresses images, and uploads to compressed bucket
@@ -0,0 +1,112 @@
+import io
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from PIL import Image
+
+# Modes JPEG can store directly, everything else is converted to RGB first
+JPEG_MODES = ('RGB', 'L', 'CMYK')
+
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '10'))
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_s3_client():
+    """
+    Return the shared S3 client, created once per execution environment
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client('s3', config=Config(
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    retries={'max_attempts': 3, 'mode': 'standard'}
+                ))
+    return _s3_client
+
+
+def _output_buffer():
+    """
+    Return this thread's encode buffer, emptied for reuse
+    """
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
+
+
+def open_image(image_bytes, max_size=None):
+    """
+    Decode image bytes. When every output fits in max_size, JPEG sources are
+    decoded at a reduced DCT scale, which is much cheaper than a full decode.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if max_size is not None:
+        image.draft('RGB', max_size)
+    image.load()
+    return image
+
+
+def resize(image, size):
+    """
+    Fit image within size keeping the aspect ratio, never upscaling
+    """
+    if image.width <= size[0] and image.height <= size[1]:
+        return image
+    resized = image.copy()
+    resized.thumbnail(size, Image.Resampling.LANCZOS)
+    return resized
+
+
+def prepare_for_format(image, image_format):
+    if image_format == 'JPEG' and image.mode not in JPEG_MODES:
+        return image.convert('RGB')
+    return image
+
+
+def encode(image, image_format, quality=None):
+    """
+    Encode image and return the bytes
+    """
+    buffer = _output_buffer()
+    save_kwargs = {'format': image_format}
+    if quality is not None:
+        save_kwargs['quality'] = quality
+        save_kwargs['optimize'] = True
+    prepare_for_format(image, image_format).save(buffer, **save_kwargs)
+    return buffer.getvalue()
+
+
+def render(image, conversion):
+    """
+    Produce one output for a conversion spec such as
+    {'size': (800, 600), 'format': 'JPEG', 'quality': 90}
+    """
+    # Convert before resizing so palette images are resampled with LANCZOS
+    # rather than falling back to nearest-neighbour
+    image = prepare_for_format(image, conversion['format'])
+    if 'size' in conversion:
+        image = resize(image, conversion['size'])
+    return encode(image, conversion['format'], conversion.get('quality'))
+
+
+def content_type(image_format):
+    return f"image/{image_format.lower()}"
+
+
+def compress_image(image_bytes, quality=85, max_width=1920, max_height=1080):
+    """
+    Compress and resize image to JPEG
+    """
+    # Decode at 2x the output size at least, like Image.thumbnail's
+    # reducing_gap, so LANCZOS still has detail to downsample from
+    image = open_image(image_bytes, max_size=(2 * max_width, 2 * max_height))
+    return render(image, {'size': (max_width, max_height), 'format': 'JPEG', 'quality': quality})
@@ -1,7 +1,8 @@
-import requests
+from http_client import get, cache_stats
 
 def lambda_handler(event, context):
-    r = requests.get("https://api.github.com")
+    r = get("https://api.github.com")
+    print(f"HTTP cache stats: {cache_stats()}")
     return {
         "statusCode": 200,
         "body": f"GitHub status: {r.status_code}"
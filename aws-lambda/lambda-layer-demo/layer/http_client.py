@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+# Timeouts are (connect, read) in seconds
+DEFAULT_TIMEOUT = (
+    float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3.05')),
+    float(os.environ.get('HTTP_READ_TIMEOUT', '10'))
+)
+DEFAULT_TTL = float(os.environ.get('HTTP_CACHE_TTL', '60'))
+CACHE_MAX_ENTRIES = int(os.environ.get('HTTP_CACHE_MAX_ENTRIES', '256'))
+CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '10'))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process-wide pooled session, created on first use so that
+    warm invocations reuse its DNS lookups and TLS connections
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # The session is shared by every caller in the container, so
+                # it must never store a Set-Cookie and replay it to others
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                retries = Retry(
+                    total=2,
+                    backoff_factor=0.2,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=('GET', 'HEAD'),
+                    # Hand the last 5xx back to the caller instead of raising RetryError
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE, max_retries=retries)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+class _CacheEntry:
+    def __init__(self, response, expires, vary):
+        self.response = response
+        self.expires = expires
+        # (header, value) pairs of the request headers named by Vary
+        self.vary = vary
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.size = len(response.content)
+
+    def is_fresh(self):
+        return time.monotonic() < self.expires
+
+    def can_revalidate(self):
+        return self.etag is not None or self.last_modified is not None
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache bounded by entry count and total body size
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            if entry.size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._stats['stores'] += 1
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._stats['evictions'] += 1
+
+    def evict(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def record(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['hit_ratio'] = (stats['hits'] + stats['revalidated']) / lookups if lookups else 0.0
+            return stats
+
+
+_cache = ResponseCache()
+
+
+def _cache_ttl(response, default_ttl):
+    """
+    Work out how long a response may be served from cache, honouring
+    Cache-Control from the upstream. Returns None if it must not be stored.
+    """
+    directives = {}
+    for part in response.headers.get('Cache-Control', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+
+    if 'no-store' in directives:
+        return None
+    # Per-user responses can't be shared, and Vary: * never matches
+    if 'Set-Cookie' in response.headers or '*' in _vary_names(response):
+        return None
+    if 'no-cache' in directives:
+        return 0.0
+    if 'max-age' in directives:
+        try:
+            return float(directives['max-age'])
+        except ValueError:
+            pass
+    return default_ttl
+
+
+def _vary_names(response):
+    return tuple(
+        name.strip().lower()
+        for name in response.headers.get('Vary', '').split(',')
+        if name.strip()
+    )
+
+
+def _vary_values(names, headers):
+    """
+    Values the request sends for the headers named by Vary, taking the
+    session defaults into account
+    """
+    merged = CaseInsensitiveDict(get_session().headers)
+    merged.update(headers or {})
+    return tuple((name, merged.get(name)) for name in names)
+
+
+def _cache_key(url, params, headers):
+    prepared = requests.Request('GET', url, params=params).prepare()
+    return prepared.url, tuple(sorted((k.lower(), v) for k, v in (headers or {}).items()))
+
+
+def get(url, params=None, headers=None, ttl=None, timeout=None, **kwargs):
+    """
+    GET through the shared session and response cache.
+
+    Fresh cache entries are returned with no upstream round-trip. Stale
+    entries with an ETag or Last-Modified are revalidated with a conditional
+    request, and a 304 reuses the cached body. Cached responses are shared
+    between callers and should be treated as read-only.
+
+    A cached entry is only used when the request headers named by the
+    response's Vary match. Requests with any extra keyword argument (auth,
+    cookies, stream, ...) bypass the cache entirely, since the cache key only
+    covers the URL, params and headers.
+    """
+    if kwargs:
+        return request('GET', url, params=params, headers=headers, timeout=timeout, **kwargs)
+
+    default_ttl = DEFAULT_TTL if ttl is None else ttl
+    key = _cache_key(url, params, headers)
+    entry = _cache.get(key)
+    if entry is not None and entry.vary != _vary_values([name for name, _ in entry.vary], headers):
+        entry = None
+
+    if entry is not None and entry.is_fresh():
+        _cache.record('hits')
+        return entry.response
+
+    request_headers = dict(headers or {})
+    if entry is not None:
+        if entry.etag:
+            request_headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            request_headers['If-Modified-Since'] = entry.last_modified
+
+    response = get_session().get(
+        url,
+        params=params,
+        headers=request_headers,
+        timeout=timeout or DEFAULT_TIMEOUT
+    )
+
+    if response.status_code == 304 and entry is not None:
+        _cache.record('revalidated')
+        new_ttl = _cache_ttl(response, default_ttl)
+        if new_ttl is None:
+            _cache.evict(key)
+        else:
+            entry.expires = time.monotonic() + new_ttl
+        return entry.response
+
+    _cache.record('misses')
+    if response.status_code == 200:
+        response_ttl = _cache_ttl(response, default_ttl)
+        if response_ttl is not None:
+            vary = _vary_values(_vary_names(response), headers)
+            new_entry = _CacheEntry(response, time.monotonic() + response_ttl, vary)
+            # Zero-TTL responses are only worth keeping if they can be revalidated
+            if response_ttl > 0 or new_entry.can_revalidate():
+                _cache.put(key, new_entry)
+
+    return response
+
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Uncached request through the shared session with the default timeouts
+    """
+    return get_session().request(method, url, timeout=timeout or DEFAULT_TIMEOUT, **kwargs)
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def clear_cache():
+    _cache.clear()
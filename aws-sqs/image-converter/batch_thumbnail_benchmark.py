@@ -0,0 +1,159 @@
+import argparse
+import math
+import os
+import sys
+import time
+
+# image_engine 位於共用的 Lambda layer 目錄
+LAYER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'aws-lambda', 'image-engine-layer', 'layer')
+sys.path.insert(0, os.path.normpath(LAYER_DIR))
+
+try:
+    import numpy as np
+    from PIL import Image, ImageDraw
+    from image_engine import encode, prepare_for_format, resize
+except ImportError as e:
+    print(f"錯誤: 缺少套件 ({e})")
+    print("執行: pip install Pillow numpy boto3")
+    sys.exit(1)
+
+# 比較 NumPy 向量化批次縮圖與目前 image_engine 的逐張 Pillow 縮圖。
+# 批次版本只存在於這個腳本中：實測比逐張慢，還會讓 layer 多帶 NumPy，
+# 因此沒有放進 layer，image_converter 只保留 SQS 批次與部分失敗回報。
+#
+# 記錄結果 (1 vCPU, --count 10 --repeat 20, 目標 200x150, 逐張 / 批次 ms/張):
+#   320x240: 縮圖 1.59 / 2.48 (-56%), 縮圖+編碼 2.01 / 2.61 (-30%)
+#   390x290: 縮圖 2.11 / 3.27 (-55%), 縮圖+編碼 2.75 / 3.84 (-40%)
+#   240x180: 縮圖 1.28 / 2.20 (-72%), 縮圖+編碼 1.86 / 2.09 (-12%)
+#   批次結果與 Pillow 的最大像素差 19-24 (邊緣處)
+
+# 與 image_converter 中有指定尺寸的轉換相同
+THUMBNAIL_SIZES = [(800, 600), (200, 150)]
+
+
+def thumbnail_size(source_size, size):
+    """
+    計算 Image.thumbnail 會選擇的輸出尺寸
+    """
+    width, height = source_size
+    x, y = size
+    if x >= width and y >= height:
+        return source_size
+
+    aspect = width / height
+    if x / y >= aspect:
+        candidates = (math.floor(y * aspect), math.ceil(y * aspect))
+        x = max(min(candidates, key=lambda n: abs(aspect - n / y)), 1)
+    else:
+        candidates = (math.floor(x / aspect), math.ceil(x / aspect))
+        y = max(min(candidates, key=lambda n: 0 if n == 0 else abs(aspect - x / n)), 1)
+    return x, y
+
+
+def lanczos_weights(in_size, out_size):
+    """
+    (out_size, in_size) 的 LANCZOS 重採樣矩陣，每列總和為 1
+    """
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    centers = (np.arange(out_size) + 0.5) * scale
+    x = ((np.arange(in_size) + 0.5)[None, :] - centers[:, None]) / filterscale
+    weights = np.sinc(x) * np.sinc(x / 3.0)
+    weights[np.abs(x) >= 3.0] = 0.0
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights.astype(np.float32)
+
+
+def thumbnail_batch(images, size):
+    """
+    將同尺寸的 RGB 圖片疊成 (N, H, W, C) 陣列，每個軸用一次矩陣乘法一起縮圖
+    """
+    width, height = images[0].size
+    if width <= size[0] and height <= size[1]:
+        return list(images)
+    out_width, out_height = thumbnail_size((width, height), size)
+
+    data = np.stack([np.asarray(image) for image in images]).astype(np.float32)
+    # (N, C, H, W) @ (W, out_W) -> (N, C, H, out_W)
+    data = np.matmul(data.transpose(0, 3, 1, 2), lanczos_weights(width, out_width).T)
+    # (out_H, H) @ (N, C, H, out_W) -> (N, C, out_H, out_W)
+    data = np.matmul(lanczos_weights(height, out_height), data)
+
+    resized = np.clip(np.rint(data), 0, 255).astype(np.uint8).transpose(0, 2, 3, 1)
+    return [Image.fromarray(array) for array in resized]
+
+
+def create_test_images(count, width, height):
+    """
+    創建相同尺寸、內容不同的測試圖片
+    """
+    images = []
+    for i in range(count):
+        image = Image.new('RGB', (width, height), color=(i * 37 % 256, 120, 200))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([width // 10, height // 10, width // 2, height // 2], fill=(255, 0, 0))
+        draw.ellipse([width // 3, height // 3, width - 5, height - 5], outline=(0, 128, 0), width=3)
+        draw.text((10, 10), f"Test Image #{i + 1}", fill='black')
+        images.append(image)
+    return images
+
+
+def time_best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_benchmark(count, width, height, repeat, quality):
+    images = [prepare_for_format(image, 'JPEG') for image in create_test_images(count, width, height)]
+
+    print(f"{count} 張 {width}x{height} 圖片, 取 {repeat} 次中最快的結果")
+    print("-" * 60)
+
+    for size in THUMBNAIL_SIZES:
+        per_image_resize, per_image = time_best(lambda: [resize(image, size) for image in images], repeat)
+        batch_resize, batched = time_best(lambda: thumbnail_batch(images, size), repeat)
+
+        per_image_total, _ = time_best(
+            lambda: [encode(resize(image, size), 'JPEG', quality) for image in images], repeat
+        )
+        batch_total, _ = time_best(
+            lambda: [encode(image, 'JPEG', quality) for image in thumbnail_batch(images, size)], repeat
+        )
+
+        max_diff = max(
+            int(np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max())
+            for a, b in zip(per_image, batched)
+        )
+
+        print(f"目標尺寸 {size[0]}x{size[1]} -> 輸出 {batched[0].width}x{batched[0].height}")
+        for label, per_image_time, batch_time in (
+            ('縮圖', per_image_resize, batch_resize),
+            ('縮圖+編碼', per_image_total, batch_total),
+        ):
+            per_image_ms = per_image_time / count * 1000
+            batch_ms = batch_time / count * 1000
+            saved = (per_image_ms - batch_ms) / per_image_ms * 100 if per_image_ms else 0.0
+            print(f"  {label}: 逐張 {per_image_ms:.2f} ms/張, 批次 {batch_ms:.2f} ms/張, "
+                  f"每張節省 {per_image_ms - batch_ms:.2f} ms ({saved:.1f}%)")
+        print(f"  與逐張結果的最大像素差: {max_diff}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較批次 (NumPy) 與逐張 (Pillow) 縮圖的每張圖片耗時')
+    parser.add_argument('--count', type=int, default=10, help='每批圖片數量 (對應 SQS BatchSize)')
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--quality', type=int, default=85)
+    args = parser.parse_args()
+
+    run_benchmark(args.count, args.width, args.height, args.repeat, args.quality)
+
+
+if __name__ == "__main__":
+    main()
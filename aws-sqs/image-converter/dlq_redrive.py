@@ -0,0 +1,579 @@
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+
+from botocore.exceptions import ClientError, BotoCoreError
+
+from simple_upload_test import AWS_REGION, get_aws_client, get_stack_info
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# 分類結果
+CORRUPT_INPUT = 'corrupt_input'          # 圖片本身損壞，重送也不會成功
+MISSING_SOURCE = 'missing_source'        # 來源物件已不存在
+MALFORMED_MESSAGE = 'malformed_message'  # 消息內容無法解析
+TRANSIENT = 'transient'                  # 暫時性錯誤 (S3 節流、逾時等)，可重送
+UNKNOWN = 'unknown'                      # 無法判斷，保留在 DLQ 中等待人工處理
+
+PERMANENT_FAILURES = (CORRUPT_INPUT, MISSING_SOURCE, MALFORMED_MESSAGE)
+
+# 視為暫時性的 S3 錯誤碼
+TRANSIENT_S3_ERRORS = (
+    'SlowDown', 'Throttling', 'ThrottlingException', 'RequestTimeout',
+    'RequestTimeTooSkewed', 'InternalError', 'ServiceUnavailable', '500', '503'
+)
+MISSING_S3_ERRORS = ('NoSuchKey', 'NotFound', '404')
+
+# SQS 批次 API 一次最多 10 則消息
+SQS_BATCH_SIZE = 10
+
+# 記錄消息已被重送次數的 message attribute
+REDRIVE_COUNT_ATTRIBUTE = 'RedriveCount'
+
+
+class RateLimiter:
+    """
+    Token bucket 速率限制器，避免重送本身把處理管線壓垮
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(float(self.rate), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # 批次大於每秒上限時允許預支，之後的呼叫會等待補回
+                if self.tokens >= min(count, self.rate):
+                    self.tokens -= count
+                    return
+                wait = (min(count, self.rate) - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RedriveStats:
+    """
+    執行緒安全的進度與結果統計
+    """
+
+    def __init__(self, max_messages=None):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.max_messages = max_messages
+        self.claimed = 0
+        self.received = 0
+        self.outcomes = Counter()
+        self.reasons = Counter()
+
+    def claim(self, count):
+        """
+        預留本次可接收的消息數量，達到 --max-messages 上限時回傳 0
+        """
+        with self.lock:
+            if self.max_messages is not None:
+                count = max(0, min(count, self.max_messages - self.claimed))
+            self.claimed += count
+            return count
+
+    def release(self, count):
+        with self.lock:
+            self.claimed -= count
+
+    def record_received(self, count):
+        with self.lock:
+            self.received += count
+
+    def record(self, outcome, classification, count=1):
+        with self.lock:
+            self.outcomes[outcome] += count
+            self.reasons[classification] += count
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            processed = sum(self.outcomes.values())
+            return {
+                'elapsed': elapsed,
+                'received': self.received,
+                'processed': processed,
+                'throughput': processed / elapsed if elapsed > 0 else 0.0,
+                'outcomes': dict(self.outcomes),
+                'reasons': dict(self.reasons),
+            }
+
+
+def get_redrive_count(message):
+    """
+    讀取消息已被本工具重送的次數
+    """
+    attribute = message.get('MessageAttributes', {}).get(REDRIVE_COUNT_ATTRIBUTE)
+    try:
+        return int(attribute['StringValue']) if attribute else 0
+    except (KeyError, ValueError):
+        return 0
+
+
+def classify_message(s3_client, message, verify_images=True, max_redrives=None):
+    """
+    根據來源物件狀態判斷消息失敗的原因
+    回傳 (分類, 說明, 物件 key)
+    """
+    try:
+        body = json.loads(message['Body'])
+        bucket_name = body['detail']['bucket']['name']
+        object_key = unquote_plus(body['detail']['object']['key'])
+    except (ValueError, KeyError, TypeError):
+        return MALFORMED_MESSAGE, '無法解析消息內容', None
+
+    # 重送多次仍回到 DLQ，代表錯誤是確定性的 (例如逾時或記憶體不足)，交由人工處理
+    redrive_count = get_redrive_count(message)
+    if max_redrives is not None and redrive_count >= max_redrives:
+        return UNKNOWN, f'已重送 {redrive_count} 次仍失敗', object_key
+
+    try:
+        if not verify_images:
+            s3_client.head_object(Bucket=bucket_name, Key=object_key)
+            return TRANSIENT, '來源物件存在 (未驗證圖片內容)', object_key
+
+        response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
+        image_content = response['Body'].read()
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        if error_code in MISSING_S3_ERRORS:
+            return MISSING_SOURCE, f'來源物件不存在 ({error_code})', object_key
+        if error_code in TRANSIENT_S3_ERRORS:
+            return TRANSIENT, f'S3 暫時性錯誤 ({error_code})', object_key
+        return UNKNOWN, f'S3 錯誤 ({error_code})', object_key
+    except BotoCoreError as e:
+        # 連線逾時、端點錯誤等網路問題
+        return TRANSIENT, f'S3 連線錯誤 ({e.__class__.__name__})', object_key
+
+    try:
+        with Image.open(io.BytesIO(image_content)) as image:
+            image.verify()
+    except Exception as e:
+        return CORRUPT_INPUT, f'圖片損壞 ({str(e)})', object_key
+
+    return TRANSIENT, '來源圖片正常，推定為暫時性錯誤', object_key
+
+
+class DLQRedrive:
+    """
+    從 DLQ 平行長輪詢接收消息，分類後丟棄永久失敗的消息，
+    並以限速方式重送到主隊列或直接呼叫轉換 Lambda
+    """
+
+    def __init__(self, sqs_client, s3_client, lambda_client, dlq_url, main_queue_url,
+                 converter_function, args):
+        self.sqs_client = sqs_client
+        self.s3_client = s3_client
+        self.lambda_client = lambda_client
+        self.dlq_url = dlq_url
+        self.main_queue_url = main_queue_url
+        self.converter_function = converter_function
+        self.args = args
+        self.rate_limiter = RateLimiter(args.rate)
+        self.stats = RedriveStats(args.max_messages)
+        self.stop_event = threading.Event()
+        self.print_lock = threading.Lock()
+        # 執行結束時要重新設為可見的消息 (dry-run 的所有消息與保留的消息)，
+        # 以 MessageId 為 key 保存最新的 receipt handle
+        self.held_messages = {}
+        # 本次執行已處理過的 MessageId，可見性逾時後再次收到時不重複處理
+        self.seen_ids = set()
+        self.held_lock = threading.Lock()
+
+    def log(self, message):
+        with self.print_lock:
+            print(message)
+
+    def receive_batch(self):
+        count = self.stats.claim(SQS_BATCH_SIZE)
+        if count == 0:
+            return [], 0
+
+        try:
+            response = self.sqs_client.receive_message(
+                QueueUrl=self.dlq_url,
+                MaxNumberOfMessages=count,
+                WaitTimeSeconds=self.args.wait_time,
+                VisibilityTimeout=self.args.visibility_timeout,
+                AttributeNames=['ApproximateReceiveCount'],
+                MessageAttributeNames=['All']
+            )
+        except (ClientError, BotoCoreError):
+            self.stats.release(count)
+            raise
+        messages, repeats = self.filter_seen(response.get('Messages', []))
+
+        self.stats.release(count - len(messages))
+        self.stats.record_received(len(messages))
+        return messages, repeats
+
+    def filter_seen(self, messages):
+        """
+        分出本次執行第一次收到的消息；重複收到的消息改為保留到結束，
+        並更新為最新的 receipt handle
+        """
+        new_messages = []
+        repeats = 0
+        with self.held_lock:
+            for message in messages:
+                if message['MessageId'] in self.seen_ids:
+                    self.held_messages[message['MessageId']] = message
+                    repeats += 1
+                else:
+                    self.seen_ids.add(message['MessageId'])
+                    new_messages.append(message)
+        return new_messages, repeats
+
+    def delete_messages(self, messages):
+        """
+        從 DLQ 刪除消息，回傳刪除失敗的 MessageId
+        """
+        if not messages:
+            return set()
+
+        response = self.sqs_client.delete_message_batch(
+            QueueUrl=self.dlq_url,
+            Entries=[
+                {'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']}
+                for i, message in enumerate(messages)
+            ]
+        )
+        return {messages[int(failure['Id'])]['MessageId'] for failure in response.get('Failed', [])}
+
+    def hold(self, messages):
+        with self.held_lock:
+            for message in messages:
+                self.held_messages[message['MessageId']] = message
+
+    def change_visibility(self, messages, visibility_timeout):
+        for start in range(0, len(messages), SQS_BATCH_SIZE):
+            batch = messages[start:start + SQS_BATCH_SIZE]
+            try:
+                response = self.sqs_client.change_message_visibility_batch(
+                    QueueUrl=self.dlq_url,
+                    Entries=[
+                        {
+                            'Id': str(i),
+                            'ReceiptHandle': message['ReceiptHandle'],
+                            'VisibilityTimeout': visibility_timeout
+                        }
+                        for i, message in enumerate(batch)
+                    ]
+                )
+            except (ClientError, BotoCoreError) as e:
+                self.log(f"無法變更 {len(batch)} 則消息的可見性 - {e}")
+                continue
+            for failure in response.get('Failed', []):
+                self.log(f"  無法變更可見性 {batch[int(failure['Id'])]['MessageId']}: {failure.get('Message', failure['Code'])}")
+
+    def keep_held_hidden(self):
+        """
+        每半個可見性逾時延長一次保留消息的可見性，避免執行時間較長時被重複接收
+        """
+        interval = max(1.0, self.args.visibility_timeout / 2)
+        while not self.stop_event.wait(interval):
+            with self.held_lock:
+                messages = list(self.held_messages.values())
+            self.change_visibility(messages, self.args.visibility_timeout)
+
+    def release_held(self):
+        """
+        將保留的消息設回可見，之後的執行不必等待可見性逾時
+        """
+        with self.held_lock:
+            messages = list(self.held_messages.values())
+            self.held_messages = {}
+        self.change_visibility(messages, 0)
+
+    def replay_to_queue(self, messages):
+        """
+        將消息重新送回主隊列，回傳成功送出的消息
+        """
+        self.rate_limiter.acquire(len(messages))
+
+        entries = []
+        for i, message in enumerate(messages):
+            attributes = dict(message.get('MessageAttributes', {}))
+            attributes[REDRIVE_COUNT_ATTRIBUTE] = {
+                'DataType': 'Number',
+                'StringValue': str(get_redrive_count(message) + 1)
+            }
+            entries.append({'Id': str(i), 'MessageBody': message['Body'], 'MessageAttributes': attributes})
+
+        response = self.sqs_client.send_message_batch(QueueUrl=self.main_queue_url, Entries=entries)
+        for failure in response.get('Failed', []):
+            self.log(f"  重送失敗 {messages[int(failure['Id'])]['MessageId']}: {failure.get('Message', failure['Code'])}")
+
+        return [messages[int(success['Id'])] for success in response.get('Successful', [])]
+
+    def replay_by_invoke(self, messages):
+        """
+        直接以 SQS 事件格式同步呼叫轉換 Lambda，回傳處理成功的消息
+        """
+        replayed = []
+        for message in messages:
+            self.rate_limiter.acquire()
+
+            event = {
+                'Records': [{
+                    'messageId': message['MessageId'],
+                    'receiptHandle': message['ReceiptHandle'],
+                    'body': message['Body'],
+                    'attributes': message.get('Attributes', {}),
+                    'eventSource': 'aws:sqs'
+                }]
+            }
+            try:
+                response = self.lambda_client.invoke(
+                    FunctionName=self.converter_function,
+                    InvocationType='RequestResponse',
+                    Payload=json.dumps(event)
+                )
+            except (ClientError, BotoCoreError) as e:
+                self.log(f"  呼叫 Lambda 失敗 {message['MessageId']}: {e}")
+                continue
+
+            payload = response['Payload'].read().decode('utf-8', errors='replace')
+            if 'FunctionError' in response:
+                self.log(f"  Lambda 處理失敗 {message['MessageId']}: {payload[:200]}")
+                continue
+
+            # 轉換 Lambda 以 batchItemFailures 回報個別消息失敗
+            try:
+                batch_item_failures = json.loads(payload).get('batchItemFailures', [])
+            except (ValueError, AttributeError):
+                batch_item_failures = []
+            if batch_item_failures:
+                self.log(f"  Lambda 處理失敗 {message['MessageId']}: batchItemFailures")
+                continue
+
+            replayed.append(message)
+        return replayed
+
+    def process_batch(self, messages):
+        drop, replay, keep = [], [], []
+        classifications = {}
+
+        for message in messages:
+            classification, detail, object_key = classify_message(
+                self.s3_client, message,
+                verify_images=self.args.verify_images,
+                max_redrives=self.args.max_redrives
+            )
+            classifications[message['MessageId']] = classification
+
+            if classification in PERMANENT_FAILURES:
+                drop.append(message)
+                action = '將丟棄' if self.args.dry_run else '丟棄'
+                self.log(f"  {action} [{classification}] {object_key or message['MessageId']}: {detail}")
+            elif classification == TRANSIENT:
+                replay.append(message)
+            else:
+                keep.append(message)
+                self.log(f"  保留 [{classification}] {object_key or message['MessageId']}: {detail}")
+
+        if self.args.dry_run:
+            self.hold(messages)
+            for message in drop:
+                self.stats.record('would_drop', classifications[message['MessageId']])
+            for message in replay:
+                self.stats.record('would_replay', classifications[message['MessageId']])
+            for message in keep:
+                self.stats.record('kept', classifications[message['MessageId']])
+            return
+
+        # 永久失敗的消息直接從 DLQ 刪除
+        failed_deletes = self.delete_messages(drop)
+        for message in drop:
+            outcome = 'failed' if message['MessageId'] in failed_deletes else 'dropped'
+            self.stats.record(outcome, classifications[message['MessageId']])
+
+        # 暫時性失敗的消息重送，成功後才從 DLQ 刪除
+        if replay:
+            if self.args.mode == 'invoke':
+                replayed = self.replay_by_invoke(replay)
+            else:
+                replayed = self.replay_to_queue(replay)
+
+            failed_deletes = self.delete_messages(replayed)
+            replayed_ids = {message['MessageId'] for message in replayed} - failed_deletes
+            for message in replay:
+                outcome = 'replayed' if message['MessageId'] in replayed_ids else 'failed'
+                self.stats.record(outcome, classifications[message['MessageId']])
+
+        self.hold(keep)
+        for message in keep:
+            self.stats.record('kept', classifications[message['MessageId']])
+
+    def worker(self, worker_id):
+        while not self.stop_event.is_set():
+            try:
+                messages, repeats = self.receive_batch()
+            except (ClientError, BotoCoreError) as e:
+                self.log(f"Worker {worker_id}: 接收 DLQ 消息失敗 - {e}")
+                time.sleep(1)
+                continue
+
+            # 長輪詢後仍沒有新消息，代表 DLQ 已清空、已達處理上限，
+            # 或剩下的都是本次已處理過的消息
+            if not messages:
+                if repeats:
+                    self.log(f"Worker {worker_id}: 只收到已處理過的消息，停止接收")
+                return
+
+            try:
+                self.process_batch(messages)
+            except (ClientError, BotoCoreError) as e:
+                # 未刪除的消息會在可見性逾時後重新出現在 DLQ 中
+                self.log(f"Worker {worker_id}: 處理批次失敗 - {e}")
+                for _ in messages:
+                    self.stats.record('failed', UNKNOWN)
+
+    def report_progress(self):
+        while not self.stop_event.wait(self.args.report_interval):
+            self.log(format_progress(self.stats.snapshot()))
+
+    def run(self):
+        reporter = threading.Thread(target=self.report_progress, daemon=True)
+        reporter.start()
+        keeper = threading.Thread(target=self.keep_held_hidden, daemon=True)
+        keeper.start()
+
+        executor = ThreadPoolExecutor(max_workers=self.args.workers)
+        futures = [executor.submit(self.worker, i + 1) for i in range(self.args.workers)]
+        try:
+            for future in futures:
+                future.result()
+        except KeyboardInterrupt:
+            self.log("\n收到中斷訊號，等待進行中的批次完成...")
+        finally:
+            self.stop_event.set()
+            executor.shutdown(wait=True)
+            reporter.join()
+            keeper.join()
+            self.release_held()
+
+        return self.stats.snapshot()
+
+
+def format_progress(snapshot):
+    outcomes = snapshot['outcomes']
+    parts = [f"{name} {count}" for name, count in sorted(outcomes.items())]
+    return (
+        f"[{snapshot['elapsed']:.0f}s] 已處理 {snapshot['processed']}/{snapshot['received']} 則 "
+        f"| 吞吐量 {snapshot['throughput']:.1f} msg/s"
+        + (f" | {', '.join(parts)}" if parts else "")
+    )
+
+
+def print_summary(snapshot, dry_run):
+    print("\nDLQ 重送結果:")
+    print("-" * 40)
+    print(f"  執行時間: {snapshot['elapsed']:.1f} 秒")
+    print(f"  接收消息: {snapshot['received']} 則")
+    print(f"  平均吞吐量: {snapshot['throughput']:.1f} msg/s")
+
+    print("  處理結果:")
+    for outcome, count in sorted(snapshot['outcomes'].items()):
+        print(f"    {outcome}: {count}")
+
+    print("  失敗原因分類:")
+    for reason, count in sorted(snapshot['reasons'].items()):
+        print(f"    {reason}: {count}")
+
+    if dry_run:
+        print("\n(dry-run 模式，沒有刪除或重送任何消息)")
+        print("已接收的消息已重新設為可見，可直接執行正式重送")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='平行、限速的 DLQ 重送工具')
+    parser.add_argument('--mode', choices=['queue', 'invoke'], default='queue',
+                        help='queue: 重送到主隊列; invoke: 直接呼叫轉換 Lambda')
+    parser.add_argument('--workers', type=int, default=4, help='平行接收 DLQ 的執行緒數量')
+    parser.add_argument('--rate', type=float, default=10,
+                        help='每秒最多重送的消息數量 (0 表示不限速)')
+    parser.add_argument('--max-messages', type=int, default=None, help='本次最多處理的消息數量')
+    parser.add_argument('--wait-time', type=int, default=20, help='長輪詢等待秒數 (0-20)')
+    parser.add_argument('--visibility-timeout', type=int, default=300,
+                        help='接收後消息在 DLQ 中隱藏的秒數')
+    parser.add_argument('--max-redrives', type=int, default=2,
+                        help='已重送超過此次數的消息視為無法判斷，保留在 DLQ 中')
+    parser.add_argument('--report-interval', type=float, default=5, help='進度回報間隔秒數')
+    parser.add_argument('--no-verify', dest='verify_images', action='store_false',
+                        help='只檢查來源物件是否存在，不下載驗證圖片內容')
+    parser.add_argument('--dry-run', action='store_true', help='只分類消息，不刪除也不重送')
+    parser.add_argument('-y', '--yes', action='store_true', help='略過確認提示')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    print("Image Converter DLQ 重送工具")
+    print("=" * 50)
+    print(f"AWS Region: {AWS_REGION}")
+
+    if args.verify_images and Image is None:
+        print("警告: 未安裝 Pillow 套件，無法驗證圖片內容，改為只檢查來源物件是否存在")
+        print("執行: pip install Pillow")
+        args.verify_images = False
+
+    sqs_client = get_aws_client('sqs')
+    s3_client = get_aws_client('s3')
+    lambda_client = get_aws_client('lambda') if args.mode == 'invoke' else None
+    if not sqs_client or not s3_client or (args.mode == 'invoke' and not lambda_client):
+        return
+
+    stack_info = get_stack_info()
+    if not stack_info:
+        print("無法獲取 AWS 資源資訊，重送終止")
+        return
+
+    try:
+        dlq_url = sqs_client.get_queue_url(QueueName=stack_info['dlq_name'])['QueueUrl']
+        main_queue_url = sqs_client.get_queue_url(QueueName=stack_info['queue_name'])['QueueUrl']
+    except Exception as e:
+        print(f"無法獲取隊列 URL: {e}")
+        return
+
+    target = stack_info['converter_function'] if args.mode == 'invoke' else stack_info['queue_name']
+    print(f"DLQ: {stack_info['dlq_name']}")
+    print(f"重送目標 ({args.mode}): {target}")
+    print(f"執行緒: {args.workers}, 速率上限: {args.rate or '不限'} msg/s")
+
+    if not args.dry_run and not args.yes:
+        confirm = input(f"\n確定要開始重送嗎? 永久失敗的消息將被刪除 (y/N): ")
+        if confirm.lower() != 'y':
+            print("重送取消")
+            return
+
+    redrive = DLQRedrive(
+        sqs_client, s3_client, lambda_client, dlq_url, main_queue_url,
+        stack_info.get('converter_function'), args
+    )
+    snapshot = redrive.run()
+    print_summary(snapshot, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
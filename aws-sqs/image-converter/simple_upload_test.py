@@ -45,6 +45,8 @@ def get_stack_info():
                 # 從 URL 提取隊列名稱
                 stack_info['queue_name'] = output['OutputValue'].split('/')[-1]
                 stack_info['dlq_name'] = stack_info['queue_name'].replace('-queue-', '-dlq-')
+            elif output['OutputKey'] == 'ImageConverterFunctionArn':
+                stack_info['converter_function'] = output['OutputValue']
         
         return stack_info
     except Exception as e:
@@ -54,7 +56,8 @@ def get_stack_info():
             'source_bucket': 'image-converter-image-bucket-dev',
             'destination_bucket': 'image-converter-converted-image-bucket-dev',
             'queue_name': 'image-converter-image-processing-queue-dev',
-            'dlq_name': 'image-converter-image-processing-dlq-dev'
+            'dlq_name': 'image-converter-image-processing-dlq-dev',
+            'converter_function': 'image-converter-image-converter-dev'
         }
 
 def upload_image_to_bucket(file_path, bucket_name, s3_key, thread_id=None):
@@ -285,6 +288,7 @@ def check_sqs_status():
         if int(dlq_messages) > 0:
             print(f"  ** 發現 {dlq_messages} 個失敗的消息在 DLQ 中 **")
             print(f"  這表示有圖片處理失敗，DLQ 正常運作")
+            print(f"  可執行 python dlq_redrive.py --dry-run 分類失敗消息，再決定是否重新處理")
         
     except Exception as e:
         print(f"無法獲取 DLQ 狀態: {e}")
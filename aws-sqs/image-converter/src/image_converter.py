@@ -1,11 +1,22 @@
 import json
-import boto3
 import os
-from PIL import Image
-import io
 from urllib.parse import unquote_plus
+from image_engine import content_type, get_s3_client, open_image, prepare_for_format, render
 
-s3_client = boto3.client('s3')
+# Shared S3 client from the image engine layer
+s3_client = get_s3_client()
+
+# Define conversion formats and sizes
+CONVERSIONS = [
+    {'format': 'JPEG', 'quality': 85, 'suffix': '_compressed.jpg'},
+    {'format': 'WEBP', 'quality': 80, 'suffix': '_optimized.webp'},
+    {'size': (800, 600), 'format': 'JPEG', 'quality': 90, 'suffix': '_medium.jpg'},
+    {'size': (200, 150), 'format': 'JPEG', 'quality': 85, 'suffix': '_thumbnail.jpg'}
+]
+
+# Stop starting new images when less than this is left before the timeout,
+# enough to finish one large image with all its conversions
+MIN_REMAINING_MS = int(os.environ.get('MIN_REMAINING_MS', '20000'))
 
 def lambda_handler(event, context):
     """
@@ -15,7 +26,18 @@ def lambda_handler(event, context):
     source_bucket = os.environ['SOURCE_BUCKET']
     destination_bucket = os.environ['DESTINATION_BUCKET']
     
-    for record in event['Records']:
+    batch_item_failures = []
+    
+    records = event['Records']
+    
+    for index, record in enumerate(records):
+        # Hand the rest of the batch back to SQS rather than timing out,
+        # which would retry the records that already succeeded too
+        if context is not None and context.get_remaining_time_in_millis() < MIN_REMAINING_MS:
+            print(f"Low on time, returning {len(records) - index} unprocessed records to the queue")
+            batch_item_failures.extend({'itemIdentifier': r['messageId']} for r in records[index:])
+            break
+        
         try:
             # Parse the SQS message body (EventBridge event)
             message_body = json.loads(record['body'])
@@ -30,75 +52,59 @@ def lambda_handler(event, context):
             response = s3_client.get_object(Bucket=source_bucket, Key=object_key)
             image_content = response['Body'].read()
             
+            # Decode now so a corrupt image only fails its own record
+            image = open_image(image_content)
+            
             # Convert image to different formats
-            convert_image(image_content, object_key, destination_bucket)
+            convert_image(image, object_key, destination_bucket)
             
             print(f"Successfully processed image: {object_key}")
             
         except Exception as e:
             print(f"Error processing record: {str(e)}")
-            raise e
+            batch_item_failures.append({'itemIdentifier': record['messageId']})
     
+    # Only the failed records are retried (ReportBatchItemFailures)
     return {
         'statusCode': 200,
-        'body': json.dumps('Image processing completed successfully')
+        'body': json.dumps('Image processing completed successfully'),
+        'batchItemFailures': batch_item_failures
     }
 
-def convert_image(image_content, original_key, destination_bucket):
+def upload_output(output, original_key, conversion, destination_bucket):
     """
-    Convert image to different formats and sizes
+    Upload one converted output to the destination bucket
     """
     
-    # Open the image
-    image = Image.open(io.BytesIO(image_content))
+    # Generate the new key
+    base_name = os.path.splitext(original_key)[0]
+    new_key = f"converted/{base_name}{conversion['suffix']}"
     
-    # Define conversion formats and sizes
-    conversions = [
-        {'format': 'JPEG', 'quality': 85, 'suffix': '_compressed.jpg'},
-        {'format': 'WEBP', 'quality': 80, 'suffix': '_optimized.webp'},
-        {'size': (800, 600), 'format': 'JPEG', 'quality': 90, 'suffix': '_medium.jpg'},
-        {'size': (200, 150), 'format': 'JPEG', 'quality': 85, 'suffix': '_thumbnail.jpg'}
-    ]
+    s3_client.put_object(
+        Bucket=destination_bucket,
+        Key=new_key,
+        Body=output,
+        ContentType=content_type(conversion['format'])
+    )
     
-    # Get the base name without extension
-    base_name = os.path.splitext(original_key)[0]
+    print(f"Converted and uploaded: {new_key}")
+
+def convert_image(image, original_key, destination_bucket):
+    """
+    Convert a decoded image to different formats and sizes
+    """
+    
+    # Convert the mode once per output format, not once per conversion
+    prepared = {}
     
-    for conversion in conversions:
+    for conversion in CONVERSIONS:
         try:
-            # Create a copy of the image
-            converted_image = image.copy()
-            
-            # Resize if size is specified
-            if 'size' in conversion:
-                converted_image.thumbnail(conversion['size'], Image.Resampling.LANCZOS)
-            
-            # Convert to RGB if saving as JPEG
-            if conversion['format'] == 'JPEG' and converted_image.mode in ('RGBA', 'P'):
-                converted_image = converted_image.convert('RGB')
-            
-            # Save to BytesIO
-            output_buffer = io.BytesIO()
-            save_kwargs = {'format': conversion['format']}
-            
-            if 'quality' in conversion:
-                save_kwargs['quality'] = conversion['quality']
-                save_kwargs['optimize'] = True
-            
-            converted_image.save(output_buffer, **save_kwargs)
-            output_buffer.seek(0)
-            
-            # Generate the new key
-            new_key = f"converted/{base_name}{conversion['suffix']}"
-            
-            # Upload to destination bucket
-            s3_client.put_object(
-                Bucket=destination_bucket,
-                Key=new_key,
-                Body=output_buffer.getvalue(),
-                ContentType=f"image/{conversion['format'].lower()}"
-            )
+            image_format = conversion['format']
+            if image_format not in prepared:
+                prepared[image_format] = prepare_for_format(image, image_format)
             
-            print(f"Converted and uploaded: {new_key}")
+            output = render(prepared[image_format], conversion)
+            upload_output(output, original_key, conversion, destination_bucket)
             
         except Exception as e:
             print(f"Error converting image with format {conversion}: {str(e)}")